@@ -0,0 +1,146 @@
+import os
+import sqlite3
+from collections import Counter
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+
+DB_PATH = Path(__file__).parent / "schedule.db"
+MAX_WEEKS = 22
+# Сколько лет назад от опорной даты ищем год, в котором день недели совпадает с расписанием
+YEAR_SEARCH_DEPTH = 6
+WEEKDAYS = {'Пн': 0, 'Вт': 1, 'Ср': 2, 'Чт': 3, 'Пт': 4, 'Сб': 5, 'Вс': 6}
+
+_calendar_cache = {}
+
+
+def resolve_date(day_month, reference=None, day_name=None):
+	# 'дд.мм' -> дата: год однозначно задает день недели из расписания,
+	# без него берем год, где дата ближе всего к опорной (переход декабрь/январь)
+	if reference is None:
+		reference = date.today()
+	day, month = map(int, day_month.split('.'))
+	candidates = []
+	for year in range(reference.year - YEAR_SEARCH_DEPTH, reference.year + 2):
+		try:
+			candidates.append(date(year, month, day))
+		except ValueError:
+			continue
+	weekday = WEEKDAYS.get(day_name)
+	matching = [candidate for candidate in candidates if candidate.weekday() == weekday]
+	if not matching:
+		matching = [candidate for candidate in candidates if abs(candidate.year - reference.year) <= 1]
+	return min(matching, key=lambda candidate: abs((candidate - reference).days))
+
+
+def build_academic_calendar(conn, max_weeks=MAX_WEEKS, reference=None):
+	conn.execute("""
+		CREATE TABLE IF NOT EXISTS academic_calendar (
+			week_number INTEGER PRIMARY KEY,
+			start_date TEXT NOT NULL,
+			end_date TEXT NOT NULL,
+			semester_start TEXT NOT NULL
+		)
+	""")
+
+	# Каждое занятие "голосует" за понедельник первой недели семестра
+	votes = Counter()
+	last_week = max_weeks
+	for week_number, day_month, day_name in conn.execute(
+		"SELECT DISTINCT week_number, date, day_name FROM schedule WHERE date IS NOT NULL"
+	):
+		lesson_date = resolve_date(day_month, reference, day_name)
+		monday = lesson_date - timedelta(days=lesson_date.weekday())
+		votes[monday - timedelta(weeks=week_number - 1)] += 1
+		last_week = max(last_week, week_number)
+	if not votes:
+		return None
+
+	semester_start = votes.most_common(1)[0][0]
+	conn.execute("DELETE FROM academic_calendar")
+	conn.executemany("""
+		INSERT INTO academic_calendar (week_number, start_date, end_date, semester_start)
+		VALUES (?, ?, ?, ?)
+	""", [
+		(
+			week,
+			(semester_start + timedelta(weeks=week - 1)).isoformat(),
+			(semester_start + timedelta(weeks=week - 1, days=6)).isoformat(),
+			semester_start.isoformat()
+		)
+		for week in range(1, last_week + 1)
+	])
+	return semester_start
+
+
+class AcademicCalendar:
+	def __init__(self, semester_start, weeks):
+		self.semester_start = semester_start
+		self.weeks = weeks
+		self.last_week = max(weeks)
+
+	@classmethod
+	def load(cls, db_path=DB_PATH):
+		try:
+			with sqlite3.connect(db_path) as conn:
+				rows = conn.execute("""
+					SELECT week_number, start_date, end_date, semester_start
+					FROM academic_calendar
+				""").fetchall()
+		except sqlite3.OperationalError:
+			return None
+		if not rows:
+			return None
+		weeks = {
+			week_number: (date.fromisoformat(start_date), date.fromisoformat(end_date))
+			for week_number, start_date, end_date, _ in rows
+		}
+		return cls(date.fromisoformat(rows[0][3]), weeks)
+
+	def week_for(self, day):
+		week = (day - self.semester_start).days // 7 + 1
+		return min(max(week, 1), self.last_week)
+
+	def week_range(self, week_number):
+		return self.weeks.get(week_number)
+
+	def resolve(self, week_number, day_month, day_name=None):
+		week_range = self.weeks.get(week_number)
+		if week_range is None:
+			return resolve_date(day_month, self.semester_start, day_name)
+		start, end = week_range
+		day, month = map(int, day_month.split('.'))
+		for year in {start.year, end.year}:
+			try:
+				candidate = date(year, month, day)
+			except ValueError:
+				continue
+			if start <= candidate <= end:
+				return candidate
+		return resolve_date(day_month, start, day_name)
+
+
+def get_calendar(db_path=DB_PATH):
+	# Перечитываем таблицу только если файл базы изменился
+	db_path = str(db_path)
+	try:
+		stamp = os.stat(db_path).st_mtime_ns
+	except OSError:
+		return None
+	cached = _calendar_cache.get(db_path)
+	if cached is not None and cached[0] == stamp:
+		return cached[1]
+	calendar = AcademicCalendar.load(db_path)
+	_calendar_cache[db_path] = (stamp, calendar)
+	return calendar
+
+
+if __name__ == "__main__":
+	print("Строю академический календарь по базе данных...")
+	reference = datetime.fromtimestamp(os.stat(DB_PATH).st_mtime).date()
+	with sqlite3.connect(DB_PATH) as conn:
+		semester_start = build_academic_calendar(conn, reference=reference)
+	if semester_start:
+		print(f"Начало семестра: {semester_start.isoformat()}")
+	else:
+		print("В расписании нет дат, календарь не построен.")
@@ -1,20 +1,54 @@
-from flask import Flask, render_template, jsonify, request, session, redirect, url_for
-from google_integration import GoogleCalendarIntegration
+from flask import (
+    Blueprint,
+    Flask,
+    Response,
+    current_app,
+    render_template,
+    jsonify,
+    request,
+    session,
+    redirect,
+    stream_with_context,
+    url_for,
+)
+from schedule_store import ScheduleStore
+from academic_calendar import get_calendar
 import sqlite3
 import os
+import json
+import threading
 from functools import lru_cache
-from datetime import datetime
+from datetime import date, datetime
 import time
 import traceback
 
 
 os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
-app = Flask(__name__)
-google_calendar = GoogleCalendarIntegration(app)
+bp = Blueprint("schedule", __name__)
 
 
 DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schedule.db")
 CACHE_TTL = 300
+MEMORY_STORE_ENABLED = os.environ.get("SCHEDULE_MEMORY_STORE", "1") != "0"
+BATCH_FETCH_SIZE = 500
+CHANGES_PAGE_SIZE = 1000
+BATCH_MAX_FILTERS = 200
+BATCH_COLUMNS = (
+    "group_name",
+    "week_number",
+    "day_name",
+    "date",
+    "start_time",
+    "end_time",
+    "subject",
+    "classroom",
+    "type",
+)
+
+
+schedule_store = ScheduleStore(DB_PATH) if MEMORY_STORE_ENABLED else None
+_local = threading.local()
+_google_lock = threading.Lock()
 
 
 cache = {
@@ -24,11 +58,30 @@ cache = {
 
 
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    # Одно соединение на поток; после fork воркера открываем новое
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        conn = sqlite3.connect(DB_PATH)
+        conn.row_factory = sqlite3.Row
+        _local.conn = conn
+        _local.pid = os.getpid()
     return conn
 
 
+def get_google_calendar():
+    # Google API тяжелый при импорте, поэтому поднимаем его при первом обращении
+    integration = current_app.extensions.get("google_calendar")
+    if integration is None:
+        with _google_lock:
+            integration = current_app.extensions.get("google_calendar")
+            if integration is None:
+                from google_integration import GoogleCalendarIntegration
+
+                integration = GoogleCalendarIntegration(current_app)
+                current_app.extensions["google_calendar"] = integration
+    return integration
+
+
 def get_cached_data(key):
     if time.time() - cache[key]["timestamp"] < CACHE_TTL:
         return cache[key]["data"]
@@ -39,13 +92,27 @@ def set_cached_data(key, data):
     cache[key] = {"data": data, "timestamp": time.time()}
 
 
-@app.route("/")
+def get_store_snapshot():
+    if schedule_store is None:
+        return None
+    try:
+        return schedule_store.get()
+    except Exception as e:
+        current_app.logger.error(f"Не удалось загрузить расписание в память: {e}")
+        return None
+
+
+@bp.route("/")
 def index():
     return render_template("index.html")
 
 
-@app.route("/api/groups")
+@bp.route("/api/groups")
 def get_groups():
+    snapshot = get_store_snapshot()
+    if snapshot is not None:
+        return jsonify(snapshot.groups())
+
     cached_data = get_cached_data("groups")
     if cached_data is not None:
         return jsonify(cached_data)
@@ -61,13 +128,22 @@ def get_groups():
         return jsonify(groups)
 
 
-@app.route("/api/current_week")
+@bp.route("/api/current_week")
 def get_current_week():
+    calendar = get_calendar(DB_PATH)
+    if calendar is not None:
+        return jsonify({"week": calendar.week_for(date.today())})
+
+    today = datetime.now().strftime("%d.%m")
+    snapshot = get_store_snapshot()
+    if snapshot is not None:
+        week = snapshot.week_for_date(today)
+        return jsonify({"week": week if week is not None else 1})
+
     cached_data = get_cached_data("current_week")
     if cached_data is not None:
         return jsonify(cached_data)
 
-    today = datetime.now().strftime("%d.%m")
     with get_db_connection() as conn:
         week = conn.execute(
             "SELECT DISTINCT week_number FROM schedule WHERE date = ? LIMIT 1", (today,)
@@ -106,12 +182,16 @@ def get_group_schedule(group):
         ]
 
 
-@app.route("/api/schedule")
+@bp.route("/api/schedule")
 def get_schedule():
     group = request.args.get("group")
     if not group:
         return jsonify({"error": "Не указана группа"}), 400
 
+    snapshot = get_store_snapshot()
+    if snapshot is not None:
+        return jsonify(snapshot.group_schedule(group))
+
     with get_db_connection() as conn:
         schedule = conn.execute(
             """
@@ -126,7 +206,7 @@ def get_schedule():
 				type
 			FROM schedule 
 			WHERE group_name = ?
-			ORDER BY week_number, date, start_time
+			ORDER BY week_number, substr(date, 4, 2) || substr(date, 1, 2), start_time
 		""",
             (group,),
         ).fetchall()
@@ -134,7 +214,7 @@ def get_schedule():
         return jsonify([dict(row) for row in schedule])
 
 
-@app.route("/api/occupancy")
+@bp.route("/api/occupancy")
 def get_occupancy():
     try:
         date = request.args.get("date")
@@ -199,18 +279,19 @@ def get_occupancy():
 
     except Exception as e:
         tb = traceback.format_exc()
-        app.logger.error(f"Exception: {e}\n{tb}")
+        current_app.logger.error(f"Exception: {e}\n{tb}")
         return jsonify({"error": str(e), "traceback": tb}), 500
 
 
-@app.route("/api/sync/calendar", methods=["POST"])
+@bp.route("/api/sync/calendar", methods=["POST"])
 def sync_to_calendar():
+    google_calendar = get_google_calendar()
     if not google_calendar.get_calendar_service():
         return (
             jsonify(
                 {
                     "status": "auth_required",
-                    "auth_url": url_for("authorize", _external=True),
+                    "auth_url": url_for(".authorize", _external=True),
                 }
             ),
             401,
@@ -226,7 +307,7 @@ def sync_to_calendar():
 
     except Exception as e:
         tb = traceback.format_exc()
-        app.logger.error(f"Exception: {e}\n{tb}")
+        current_app.logger.error(f"Exception: {e}\n{tb}")
         return jsonify({"status": "error", "message": str(e), "traceback": tb}), 500
 
 
@@ -239,22 +320,22 @@ def clear_cache():
     get_group_schedule.cache_clear()
 
 
-@app.route("/authorize")
+@bp.route("/authorize")
 def authorize():
-    auth_url = google_calendar.authorize()
+    auth_url = get_google_calendar().authorize()
     return redirect(auth_url)
 
 
-@app.route("/oauth2callback")
+@bp.route("/oauth2callback")
 def oauth2callback():
     try:
-        google_calendar.save_credentials(request.url)
-        return redirect(url_for("index"))
+        get_google_calendar().save_credentials(request.url)
+        return redirect(url_for(".index"))
     except Exception as e:
         return f"Ошибка авторизации: {str(e)}", 400
 
 
-@app.route("/api/subjects")
+@bp.route("/api/subjects")
 def get_subjects():
     with get_db_connection() as conn:
         try:
@@ -276,23 +357,224 @@ def get_subjects():
         return jsonify(subjects)
 
 
-@app.route("/api/subject_schedule")
+@bp.route("/api/subject_schedule")
 def get_subject_schedule():
     subject = request.args.get("subject")
     week = request.args.get("week")
 
+    snapshot = get_store_snapshot()
+    if snapshot is not None:
+        return jsonify(snapshot.subject_schedule(subject, week))
+
     with get_db_connection() as conn:
         schedule = conn.execute(
             """
 			SELECT day_name, date, start_time, end_time, classroom, type
 			FROM schedule
 			WHERE subject = ? AND week_number = ?
-			ORDER BY date, start_time
+			ORDER BY substr(date, 4, 2) || substr(date, 1, 2), start_time
 		""",
             (subject, week),
         ).fetchall()
         return jsonify([dict(row) for row in schedule])
 
 
+@bp.route("/api/changes")
+def get_changes():
+    try:
+        since = int(request.args.get("since", 0))
+        limit = min(int(request.args.get("limit", CHANGES_PAGE_SIZE)), CHANGES_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"error": "since и limit должны быть числами"}), 400
+    if limit < 1:
+        return jsonify({"error": "limit должен быть положительным"}), 400
+    group = request.args.get("group")
+
+    query = """
+		SELECT seq, run_id, change_type, group_name, week_number, day_name,
+			date, start_time, end_time, subject, classroom, type, previous
+		FROM schedule_changes
+		WHERE seq > ? AND seq <= ?
+	"""
+    params = []
+    if group:
+        query += " AND group_name = ?"
+        params.append(group)
+    query += " ORDER BY seq LIMIT ?"
+
+    with get_db_connection() as conn:
+        try:
+            # Верхнюю границу фиксируем до выборки: изменения, записанные парсером
+            # между запросами, попадут в следующую страницу, а не пропадут
+            last_seq = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM schedule_changes"
+            ).fetchone()[0]
+            rows = conn.execute(query, [since, last_seq, *params, limit + 1]).fetchall()
+        except sqlite3.OperationalError:
+            return jsonify({"changes": [], "last_seq": since, "has_more": False})
+
+    has_more = len(rows) > limit
+    changes = []
+    for row in rows[:limit]:
+        change = dict(row)
+        change["previous"] = json.loads(row["previous"]) if row["previous"] else None
+        changes.append(change)
+
+    # Клиент передает last_seq в следующий запрос как since
+    if has_more:
+        last_seq = changes[-1]["seq"]
+    return jsonify(
+        {"changes": changes, "last_seq": max(last_seq, since), "has_more": has_more}
+    )
+
+
+@bp.route("/api/store/stats")
+def get_store_stats():
+    snapshot = get_store_snapshot()
+    if snapshot is None:
+        return jsonify({"error": "Хранилище в памяти отключено"}), 404
+    return jsonify(snapshot.footprint())
+
+
+def _split_args(name):
+    values = []
+    for raw in request.args.getlist(name):
+        values.extend(part.strip() for part in raw.split(",") if part.strip())
+    return values
+
+
+def _parse_week_ranges(specs):
+    ranges = []
+    for spec in specs:
+        start, _, end = spec.partition("-")
+        start = int(start)
+        end = int(end) if end else start
+        if start > end:
+            raise ValueError(f"Неверный диапазон недель: {spec}")
+        ranges.append((start, end))
+    return ranges
+
+
+def _build_batch_query(groups, subjects, week_ranges):
+    clauses = []
+    params = []
+    if groups:
+        clauses.append(f"group_name IN ({', '.join('?' * len(groups))})")
+        params.extend(groups)
+    if subjects:
+        clauses.append(f"subject IN ({', '.join('?' * len(subjects))})")
+        params.extend(subjects)
+    if week_ranges:
+        clauses.append(
+            "(" + " OR ".join("week_number BETWEEN ? AND ?" for _ in week_ranges) + ")"
+        )
+        for start, end in week_ranges:
+            params.extend((start, end))
+
+    query = f"SELECT {', '.join(BATCH_COLUMNS)} FROM schedule"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    # 'дд.мм' сортируем как ммдд, в том же порядке, что и хранилище в памяти
+    query += (
+        " ORDER BY group_name, week_number,"
+        " substr(date, 4, 2) || substr(date, 1, 2), start_time"
+    )
+    return query, params
+
+
+def _dump_json(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def _stream_batch(query, params, columnar):
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        cursor = conn.execute(query, params)
+        if columnar:
+            yield '{"columns":' + _dump_json(BATCH_COLUMNS) + ',"rows":['
+        else:
+            yield "["
+
+        first = True
+        while True:
+            rows = cursor.fetchmany(BATCH_FETCH_SIZE)
+            if not rows:
+                break
+            if columnar:
+                chunk = ",".join(_dump_json(row) for row in rows)
+            else:
+                chunk = ",".join(
+                    _dump_json(dict(zip(BATCH_COLUMNS, row))) for row in rows
+                )
+            yield chunk if first else "," + chunk
+            first = False
+
+        yield "]}" if columnar else "]"
+    finally:
+        conn.close()
+
+
+@bp.route("/api/batch_schedule")
+def get_batch_schedule():
+    groups = _split_args("group")
+    # Названия предметов сами содержат запятые, поэтому только повтором параметра
+    subjects = [value.strip() for value in request.args.getlist("subject") if value.strip()]
+    try:
+        week_ranges = _parse_week_ranges(_split_args("weeks"))
+    except ValueError:
+        return jsonify({"error": "Неверный формат недель, ожидается 1-4,8"}), 400
+
+    if not groups and not subjects:
+        return jsonify({"error": "Не указаны группы или предметы"}), 400
+    if len(groups) + len(subjects) + len(week_ranges) > BATCH_MAX_FILTERS:
+        return jsonify({"error": "Слишком много фильтров в запросе"}), 400
+
+    query, params = _build_batch_query(groups, subjects, week_ranges)
+    columnar = request.args.get("format") == "columnar"
+    return Response(
+        stream_with_context(_stream_batch(query, params, columnar)),
+        mimetype="application/json",
+    )
+
+
+@bp.route("/healthz")
+def healthz():
+    if not current_app.config.get("READY"):
+        warm_up(current_app._get_current_object())
+    if not current_app.config.get("READY"):
+        return jsonify({"status": "starting"}), 503
+    return jsonify({"status": "ready"})
+
+
+def warm_up(app):
+    # Без базы воркер все равно должен подняться, /healthz при этом отдает 503
+    if not os.path.exists(DB_PATH):
+        app.logger.warning(f"База данных не найдена: {DB_PATH}")
+        return
+    with app.app_context():
+        try:
+            with get_db_connection() as conn:
+                conn.execute("SELECT 1 FROM schedule LIMIT 1").fetchone()
+        except sqlite3.Error as e:
+            app.logger.warning(f"Не удалось прогреть базу данных: {e}")
+            return
+        get_store_snapshot()
+        get_calendar(DB_PATH)
+    app.config["READY"] = True
+
+
+def create_app(warm=True):
+    app = Flask(__name__)
+    app.secret_key = os.urandom(24)
+    app.config["SESSION_TYPE"] = "filesystem"
+    app.register_blueprint(bp)
+    if warm:
+        warm_up(app)
+    return app
+
+
+app = create_app()
+
+
 if __name__ == "__main__":
     app.run(debug=True, port=5000)
@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import time
+import statistics
+import sqlite3
+import subprocess
+from pathlib import Path
+
+
+PROJECT_DIR = Path(__file__).parent.resolve()
+RUNS = 5
+TOP_IMPORTS = 15
+
+# Дочерний процесс: импорт app (фабрика прогревает кэши) и первый запрос к API
+FIRST_RESPONSE_CODE = """
+import json, sys, time
+from app import app
+client = app.test_client()
+response = client.get("/api/schedule", query_string={"group": sys.argv[1]})
+print(json.dumps({"status": response.status_code, "finished": time.time()}))
+"""
+
+
+def run_python(args):
+	return subprocess.run(
+		[sys.executable, *args],
+		cwd=PROJECT_DIR,
+		capture_output=True,
+		text=True,
+		env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+	)
+
+
+def measure_import_time():
+	result = run_python(["-X", "importtime", "-c", "import app"])
+	imports = []
+	for line in result.stderr.splitlines():
+		if not line.startswith("import time:") or "[us]" in line:
+			continue
+		self_us, cumulative_us, name = line[len("import time:"):].split("|")
+		depth = (len(name) - len(name.lstrip()) - 1) // 2
+		imports.append((int(cumulative_us), int(self_us), depth, name.strip()))
+
+	# importtime печатает модуль после всех его зависимостей,
+	# поэтому прямые импорты app идут перед строкой самого app
+	total = 0
+	direct = []
+	pending = []
+	for item in imports:
+		cumulative, _, depth, name = item
+		if depth == 1:
+			pending.append(item)
+		elif depth == 0:
+			if name == "app":
+				total, direct = cumulative, pending
+			pending = []
+	google_loaded = any(name.startswith("google") for _, _, _, name in imports)
+	return total, sorted(direct, reverse=True)[:TOP_IMPORTS], google_loaded
+
+
+def measure_first_response(group):
+	started = time.time()
+	result = run_python(["-c", FIRST_RESPONSE_CODE, group])
+	if result.returncode != 0:
+		raise RuntimeError(result.stderr)
+	data = json.loads(result.stdout.strip().splitlines()[-1])
+	return data["status"], data["finished"] - started
+
+
+def main():
+	with sqlite3.connect(PROJECT_DIR / "schedule.db") as conn:
+		row = conn.execute("SELECT group_name FROM schedule LIMIT 1").fetchone()
+	group = row[0] if row else ""
+
+	import_times = []
+	for _ in range(RUNS):
+		total, top_imports, google_loaded = measure_import_time()
+		import_times.append(total)
+	print(f"Импорт app (-X importtime, медиана из {RUNS}): {statistics.median(import_times) / 1000:.1f} мс")
+	print(f"Google API загружен при импорте: {'да' if google_loaded else 'нет'}")
+	print("Самые тяжелые импорты верхнего уровня (последний прогон):")
+	for cumulative, _, _, name in top_imports:
+		print(f"  {cumulative / 1000:8.1f} мс  {name}")
+
+	response_times = []
+	for _ in range(RUNS):
+		status, elapsed = measure_first_response(group)
+		response_times.append(elapsed)
+	print(f"Время до первого ответа /api/schedule (статус {status}, медиана из {RUNS}): "
+		f"{statistics.median(response_times) * 1000:.1f} мс")
+
+
+if __name__ == "__main__":
+	main()
@@ -22,6 +22,26 @@ PARSER_CONFIG = {
 		'разработка', 'python', 'алгоритмы', 'структуры данных',
 		'инструментальные', '3d-моделирование', 'blender'
 	],
-	'exclude_keywords': ['лекция', 'семинар'],
-	'max_workers': 5
-}
\ No newline at end of file
+	'exclude_keywords': ['лекция', 'семинар']
+}
+
+# Настройки обхода расписания: кафедры/курсы/уровни и шардирование по процессам
+CRAWL_CONFIG = {
+	'departments': [
+		{
+			'prefix': 'М8О',
+			'group_numbers': (1, 19),
+			'courses': {
+				1: [('Специализированное высшее образование', 'СВ'), ('Базовое высшее образование', 'БВ')],
+				2: [('Бакалавриат', 'Б')],
+				3: [('Бакалавриат', 'Б')],
+				4: [('Бакалавриат', 'Б')]
+			}
+		}
+	],
+	'shards': 4,
+	'workers_per_shard': 3,
+	# Лимит на шард; суммарная нагрузка на mai.ru - shards * requests_per_second
+	'requests_per_second': 1.5,
+	'nightly_window_hours': 6
+}
@@ -6,6 +6,7 @@ from datetime import datetime
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
 from googleapiclient.discovery import build
+from academic_calendar import get_calendar, resolve_date
 
 
 
@@ -21,8 +22,9 @@ class GoogleCalendarIntegration:
 	def __init__(self, app):
 		self.app = app
 		self.credentials = None
-		self.app.secret_key = os.urandom(24)
-		self.app.config['SESSION_TYPE'] = 'filesystem'
+		if not self.app.secret_key:
+			self.app.secret_key = os.urandom(24)
+		self.app.config.setdefault('SESSION_TYPE', 'filesystem')
 		self.token_file = Path(__file__).parent / "google_token.json"
 
 
@@ -30,7 +32,7 @@ class GoogleCalendarIntegration:
 		flow = Flow.from_client_secrets_file(
 			CLIENT_SECRETS_FILE,
 			scopes=SCOPES,
-			redirect_uri=url_for('oauth2callback', _external=True))
+			redirect_uri=url_for('schedule.oauth2callback', _external=True))
 		authorization_url, state = flow.authorization_url(
 			access_type='offline',
 			include_granted_scopes='true')
@@ -43,7 +45,7 @@ class GoogleCalendarIntegration:
 			CLIENT_SECRETS_FILE,
 			scopes=SCOPES,
 			state=session['state'],
-			redirect_uri=url_for('oauth2callback', _external=True))
+			redirect_uri=url_for('schedule.oauth2callback', _external=True))
 		flow.fetch_token(authorization_response=auth_response)
 		credentials = flow.credentials
 		with open(self.token_file, 'w') as token:
@@ -105,12 +107,12 @@ class GoogleCalendarIntegration:
 
 	def _create_event_from_lesson(self, lesson):
 		try:
-			day, month = map(int, lesson['date'].split('.'))
-			year = datetime.now().year
-			current_month = datetime.now().month
-			if current_month >= 9 and month < 9:
-				year += 1
-			date_str = f"{year}-{month:02d}-{day:02d}"
+			calendar = get_calendar(DB_PATH)
+			if calendar is not None:
+				lesson_date = calendar.resolve(lesson['week_number'], lesson['date'], lesson['day_name'])
+			else:
+				lesson_date = resolve_date(lesson['date'], day_name=lesson['day_name'])
+			date_str = lesson_date.isoformat()
 			start_time_str = lesson['start_time']
 			end_time_str = lesson['end_time']
 			start_datetime = datetime.strptime(f"{date_str} {start_time_str}", "%Y-%m-%d %H:%M")
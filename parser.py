@@ -1,32 +1,59 @@
 import os
 import json
+import time
 import threading
 import logging
-from queue import Queue
+import multiprocessing
+from queue import Queue, Empty
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from functools import partial
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import TimeoutException
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 from webdriver_manager.chrome import ChromeDriverManager
 import re
 from datetime import datetime
+from urllib.parse import urlparse
 from selenium.webdriver.common.service import Service as SeleniumService
 import sqlite3
+from academic_calendar import build_academic_calendar
+from config import CRAWL_CONFIG
 
 # Настройки
 MAX_WEEKS = 22
 PRE_CHECK_WEEKS = 6
-MAX_WORKERS = 5
+WRITER_POLL_INTERVAL = 5
 BASE_URL = "https://mai.ru/education/studies/schedule/index.php"
 DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schedule.db")
 SeleniumService.LOG_FILE = os.devnull
 
+# Ожидание загрузки страницы
+PAGE_TIMEOUT_INITIAL = 5
+PAGE_TIMEOUT_MIN = 1.5
+PAGE_TIMEOUT_MAX = 15
+PAGE_POLL_FREQUENCY = 0.1
+PAGE_LESSONS = 'lessons'
+PAGE_EMPTY = 'empty'
+PAGE_NOT_FOUND = 'not_found'
+EMPTY_WEEK_MARKERS = ['нет занятий', 'занятия отсутствуют', 'занятий не найдено']
+GROUP_NOT_FOUND_MARKERS = ['группа не найдена', 'не удалось найти группу']
+# Шаблон сравнивается со всем URL, а Bitrix дописывает к статике ?<timestamp>,
+# поэтому после расширения тоже нужна звездочка
+BLOCKED_URL_PATTERNS = [
+	'*.png*', '*.jpg*', '*.jpeg*', '*.gif*', '*.svg*', '*.webp*', '*.ico*',
+	'*.css*', '*.woff*', '*.ttf*', '*.otf*', '*.mp4*', '*.webm*',
+	'*google-analytics.com*', '*googletagmanager.com*', '*mc.yandex.ru*'
+]
+RUN_ID = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+
+# Поля UNIQUE-ключа занятия и поля, изменение которых считается модификацией
+LESSON_KEY_FIELDS = ('group_name', 'week_number', 'day_name', 'start_time', 'subject')
+LESSON_VALUE_FIELDS = ('date', 'end_time', 'classroom', 'type')
+
 # Целевые предметы для фильтрации
 TARGET_KEYWORDS = [
 	'разработка', 'python', 'алгоритмы', 'структуры данных',
@@ -38,6 +65,89 @@ TARGET_KEYWORDS = [
 
 EXCLUDE_KEYWORDS = ['лекция', 'семинар']
 
+class AdaptiveTimeout:
+	# Оценка как у RTO в TCP: сглаженное время загрузки плюс четыре отклонения
+	def __init__(self, initial=PAGE_TIMEOUT_INITIAL, minimum=PAGE_TIMEOUT_MIN, maximum=PAGE_TIMEOUT_MAX):
+		self.initial = initial
+		self.minimum = minimum
+		self.maximum = maximum
+		self._stats = {}
+		self._lock = threading.Lock()
+
+	def get(self, site):
+		with self._lock:
+			stats = self._stats.get(site)
+		if stats is None:
+			return self.initial
+		srtt, rttvar = stats
+		return min(max(srtt + 4 * rttvar, self.minimum), self.maximum)
+
+	def observe(self, site, elapsed):
+		with self._lock:
+			stats = self._stats.get(site)
+			if stats is None:
+				self._stats[site] = (elapsed, elapsed / 2)
+			else:
+				srtt, rttvar = stats
+				rttvar = 0.75 * rttvar + 0.25 * abs(srtt - elapsed)
+				srtt = 0.875 * srtt + 0.125 * elapsed
+				self._stats[site] = (srtt, rttvar)
+
+	def observe_timeout(self, site):
+		self.observe(site, min(self.get(site) * 2, self.maximum))
+
+
+PAGE_TIMEOUTS = AdaptiveTimeout()
+
+
+class RateLimiter:
+	# Равномерно разносит запросы потоков одного шарда во времени
+	def __init__(self, requests_per_second):
+		self.interval = 1 / requests_per_second if requests_per_second else 0
+		self._next_slot = time.monotonic()
+		self._lock = threading.Lock()
+
+	def wait(self):
+		with self._lock:
+			now = time.monotonic()
+			slot = max(self._next_slot, now)
+			self._next_slot = slot + self.interval
+		if slot > now:
+			time.sleep(slot - now)
+
+
+RATE_LIMITER = None
+
+
+def page_state(driver):
+	if driver.find_elements(By.CSS_SELECTOR, ".step-content .mb-4"):
+		return PAGE_LESSONS
+	if driver.execute_script("return document.readyState") == 'loading':
+		return False
+	text = driver.find_element(By.TAG_NAME, 'body').text.lower()
+	if any(marker in text for marker in GROUP_NOT_FOUND_MARKERS):
+		return PAGE_NOT_FOUND
+	if any(marker in text for marker in EMPTY_WEEK_MARKERS):
+		return PAGE_EMPTY
+	return False
+
+
+def fetch_week(driver, group_name, week):
+	url = f"{BASE_URL}?group={group_name}&week={week}"
+	site = urlparse(url).netloc
+	if RATE_LIMITER is not None:
+		RATE_LIMITER.wait()
+	started = time.monotonic()
+	driver.get(url)
+	try:
+		state = WebDriverWait(driver, PAGE_TIMEOUTS.get(site), poll_frequency=PAGE_POLL_FREQUENCY).until(page_state)
+	except TimeoutException:
+		PAGE_TIMEOUTS.observe_timeout(site)
+		raise
+	PAGE_TIMEOUTS.observe(site, time.monotonic() - started)
+	return state, driver.page_source
+
+
 class DriverPool:
 	def __init__(self, max_drivers):
 		self._pool = Queue(max_drivers)
@@ -57,8 +167,14 @@ class DriverPool:
 		chrome_options.add_argument("--log-level=3")
 		chrome_options.add_argument("--disable-logging")
 		chrome_options.add_argument("--silent")
+		chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+		chrome_options.page_load_strategy = 'eager'
 		service = Service(ChromeDriverManager().install())
-		return webdriver.Chrome(service=service, options=chrome_options)
+		driver = webdriver.Chrome(service=service, options=chrome_options)
+		# Картинки, стили, шрифты и счетчики для парсинга не нужны
+		driver.execute_cdp_cmd('Network.enable', {})
+		driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+		return driver
 
 	def get_driver(self):
 		with self._lock:
@@ -73,7 +189,12 @@ class DriverPool:
 				logging.warning(f"Драйвер мертв, пересоздаем: {str(e)}")
 				self._pool.put(self._create_driver())
 
-DRIVER_POOL = DriverPool(MAX_WORKERS)
+	def close(self):
+		while not self._pool.empty():
+			self._pool.get().quit()
+
+# Пул создается в процессе шарда, см. run_shard
+DRIVER_POOL = None
 
 def init_driver():
 	return DRIVER_POOL.get_driver()
@@ -95,8 +216,29 @@ def init_db():
 				UNIQUE(group_name, week_number, day_name, start_time, subject)
 			)
 		""")
+		conn.execute("""
+			CREATE TABLE IF NOT EXISTS schedule_changes (
+				seq INTEGER PRIMARY KEY AUTOINCREMENT,
+				run_id TEXT NOT NULL,
+				change_type TEXT NOT NULL,
+				group_name TEXT NOT NULL,
+				week_number INTEGER NOT NULL,
+				day_name TEXT NOT NULL,
+				start_time TEXT NOT NULL,
+				subject TEXT NOT NULL,
+				date TEXT,
+				end_time TEXT,
+				classroom TEXT,
+				type TEXT,
+				previous TEXT
+			)
+		""")
+		conn.execute("""
+			CREATE INDEX IF NOT EXISTS idx_schedule_changes_group
+			ON schedule_changes (group_name, seq)
+		""")
 
-def save_to_db(group_name, week_number, day_data, lesson):
+def lesson_to_row(group_name, week_number, day_data, lesson):
 	day_name = day_data['day'].split(',')[0].strip()
 
 	date = None
@@ -119,25 +261,88 @@ def save_to_db(group_name, week_number, day_data, lesson):
 
 	start_time, end_time = lesson['time'].split('–') if lesson.get('time') else (None, None)
 	if not start_time or not end_time:
-		return
-	
-	with sqlite3.connect(DB_PATH) as conn:
-		conn.execute("""
-			INSERT OR IGNORE INTO schedule (
-				group_name, week_number, day_name, date,
-				start_time, end_time, subject, classroom, type
-			) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-		""", (
-			group_name,
-			week_number,
-			day_name,
-			date,
-			start_time.strip(),
-			end_time.strip(),
-			lesson['subject'],
-			lesson.get('classroom', 'каф. 806'),
-			lesson.get('type', '')
-		))
+		return None
+
+	return {
+		'group_name': group_name,
+		'week_number': week_number,
+		'day_name': day_name,
+		'date': date,
+		'start_time': start_time.strip(),
+		'end_time': end_time.strip(),
+		'subject': lesson['subject'],
+		'classroom': lesson.get('classroom', 'каф. 806'),
+		'type': lesson.get('type', '')
+	}
+
+
+def diff_lessons(existing, scraped):
+	changes = []
+	for key, values in scraped.items():
+		if key not in existing:
+			changes.append(('added', key, values, None))
+		elif existing[key] != values:
+			changes.append(('modified', key, values, existing[key]))
+	for key, values in existing.items():
+		if key not in scraped:
+			changes.append(('removed', key, values, None))
+	return changes
+
+
+def save_week_to_db(group_name, week_number, rows):
+	# Неделя успешно загружена: сравниваем ее с базой и записываем разницу в журнал
+	scraped = {}
+	for row in rows:
+		key = tuple(row[field] for field in LESSON_KEY_FIELDS)
+		scraped.setdefault(key, tuple(row[field] for field in LESSON_VALUE_FIELDS))
+
+	with sqlite3.connect(DB_PATH, timeout=30) as conn:
+		existing = {
+			row[:5]: row[5:]
+			for row in conn.execute("""
+				SELECT group_name, week_number, day_name, start_time, subject,
+					date, end_time, classroom, type
+				FROM schedule
+				WHERE group_name = ? AND week_number = ?
+			""", (group_name, week_number))
+		}
+
+		changes = diff_lessons(existing, scraped)
+		for change_type, key, values, previous in changes:
+			if change_type == 'added':
+				conn.execute("""
+					INSERT INTO schedule (
+						group_name, week_number, day_name, start_time, subject,
+						date, end_time, classroom, type
+					) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+				""", key + values)
+			elif change_type == 'modified':
+				conn.execute("""
+					UPDATE schedule SET date = ?, end_time = ?, classroom = ?, type = ?
+					WHERE group_name = ? AND week_number = ? AND day_name = ?
+						AND start_time = ? AND subject = ?
+				""", values + key)
+			else:
+				conn.execute("""
+					DELETE FROM schedule
+					WHERE group_name = ? AND week_number = ? AND day_name = ?
+						AND start_time = ? AND subject = ?
+				""", key)
+
+			conn.execute("""
+				INSERT INTO schedule_changes (
+					run_id, change_type,
+					group_name, week_number, day_name, start_time, subject,
+					date, end_time, classroom, type, previous
+				) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+			""", (
+				RUN_ID,
+				change_type,
+				*key,
+				*values,
+				json.dumps(dict(zip(LESSON_VALUE_FIELDS, previous)), ensure_ascii=False) if previous else None
+			))
+	return len(changes)
 
 
 def contains_target_subject(subject_text):
@@ -209,11 +414,28 @@ def parse_schedule_html(html):
 	return result
 
 
-def process_group(course, group_num, level_name, level_code):
+def plan_crawl(crawl_config, current_date=None):
+	# dict сохраняет порядок и убирает повторы за O(1) на группу
+	group_names = {}
+	for department in crawl_config['departments']:
+		first_group, last_group = department['group_numbers']
+		for course, levels in department['courses'].items():
+			year_suffix = get_group_year_suffix(course, current_date)
+			for group_num in range(first_group, last_group + 1):
+				for level_name, level_code in levels:
+					group_names[f"{department['prefix']}-{course}{group_num:02}{level_code}-{year_suffix}"] = None
+	return list(group_names)
+
+
+def shard_groups(group_names, shards):
+	# Все недели группы попадают в один шард: от предварительной проверки
+	# зависит, нужны ли остальные недели
+	return [group_names[shard::shards] for shard in range(shards)]
+
+
+def process_group(group_name, results):
 	driver = None
 	try:
-		year_suffix = get_group_year_suffix(course)
-		group_name = f"М8О-{course}{group_num:02}{level_code}-{year_suffix}"
 		driver = init_driver()
 		all_weeks_data = {}
 
@@ -222,34 +444,34 @@ def process_group(course, group_num, level_name, level_code):
 		# Предварительная проверка
 		has_target = False
 		for week in range(1, PRE_CHECK_WEEKS + 1):
-			url = f"{BASE_URL}?group={group_name}&week={week}"
 			try:
-				driver.get(url)
-				WebDriverWait(driver, 5).until(
-					EC.presence_of_element_located((By.CSS_SELECTOR, ".mb-4"))
-				)
-				if has_target_subjects(driver.page_source):
-					has_target = True
-					break
+				state, html = fetch_week(driver, group_name, week)
 			except Exception as e:
 				logging.warning(f"Группа {group_name}, неделя {week} - ошибка проверки: {str(e)}")
 				continue
+			if state == PAGE_NOT_FOUND:
+				return f"❌ Группа {group_name} - не найдена"
+			if state == PAGE_LESSONS and has_target_subjects(html):
+				has_target = True
+				break
 
 		if has_target:
 			logging.info(f"Группа {group_name} содержит целевые предметы, парсим все недели...")
 			for week in range(1, MAX_WEEKS + 1):
-				url = f"{BASE_URL}?group={group_name}&week={week}"
 				try:
-					driver.get(url)
-					WebDriverWait(driver, 5).until(
-						EC.presence_of_element_located((By.CSS_SELECTOR, ".mb-4"))
-					)
-					week_data = parse_schedule_html(driver.page_source)
+					state, html = fetch_week(driver, group_name, week)
+					if state == PAGE_NOT_FOUND:
+						logging.warning(f"Группа {group_name}, неделя {week} - группа пропала с сайта")
+						break
+					week_data = parse_schedule_html(html) if state == PAGE_LESSONS else []
 					if week_data:
 						all_weeks_data[f"{week} неделя"] = week_data
-						for day in week_data:
-							for lesson in day['lessons']:
-								save_to_db(group_name, week, day, lesson)
+					rows = [
+						lesson_to_row(group_name, week, day, lesson)
+						for day in week_data
+						for lesson in day['lessons']
+					]
+					results.put(('week', group_name, week, [row for row in rows if row]))
 				except Exception as e:
 					logging.warning(f"Группа {group_name}, неделя {week} - ошибка парсинга: {str(e)}")
 					continue
@@ -264,41 +486,89 @@ def process_group(course, group_num, level_name, level_code):
 			DRIVER_POOL.release_driver(driver)
 
 
-def main():
-	init_db()
-	with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-		tasks = []
-		
-		education_levels = {
-			1: [('Специализированное высшее образование', 'СВ'), ('Базовое высшее образование', 'БВ')],
-			2: [('Бакалавриат', 'Б')],
-			3: [('Бакалавриат', 'Б')],
-			4: [('Бакалавриат', 'Б')]
-		}
+def run_shard(shard_id, group_names, results, crawl_config):
+	global DRIVER_POOL, RATE_LIMITER
+	logging.basicConfig(level=logging.INFO, format=f'%(asctime)s %(levelname)s [шард {shard_id}]: %(message)s')
+	workers = min(crawl_config['workers_per_shard'], len(group_names))
+	try:
+		if workers:
+			DRIVER_POOL = DriverPool(workers)
+			RATE_LIMITER = RateLimiter(crawl_config['requests_per_second'])
+			with ThreadPoolExecutor(max_workers=workers) as executor:
+				tasks = [executor.submit(process_group, group_name, results) for group_name in group_names]
+				for future in as_completed(tasks):
+					try:
+						results.put(('group', future.result()))
+					except Exception as e:
+						results.put(('group', f"💀 Ошибка в задаче: {str(e)}"))
+	finally:
+		if DRIVER_POOL is not None:
+			DRIVER_POOL.close()
+		results.put(('done', shard_id))
 
-		for course in range(1, 5):
-			for group_num in range(1, 20):
-				for level_name, level_code in education_levels[course]:
-					tasks.append(
-						executor.submit(
-							partial(process_group, course, group_num, level_name, level_code)
-						)
-					)
 
-		for future in tqdm(as_completed(tasks), total=len(tasks), desc="Обработка групп"):
+def write_results(results, processes, total_groups):
+	# Единственный писатель в базу: шарды только присылают загруженные недели
+	running = len(processes)
+	with tqdm(total=total_groups, desc="Обработка групп") as progress:
+		while running:
 			try:
-				result = future.result()
-				logging.info(result)
-			except Exception as e:
-				logging.error(f"Ошибка в задаче: {str(e)}")
+				message = results.get(timeout=WRITER_POLL_INTERVAL)
+			except Empty:
+				if not any(process.is_alive() for process in processes):
+					logging.error("Шарды завершились, не отправив итог")
+					break
+				continue
+
+			kind = message[0]
+			if kind == 'week':
+				_, group_name, week, rows = message
+				try:
+					changed = save_week_to_db(group_name, week, rows)
+				except Exception as e:
+					logging.error(f"Группа {group_name}, неделя {week} - ошибка записи: {str(e)}")
+					continue
+				if changed:
+					logging.info(f"Группа {group_name}, неделя {week} - изменений: {changed}")
+			elif kind == 'group':
+				progress.update(1)
+				logging.info(message[1])
+			elif kind == 'done':
+				running -= 1
+
+
+def main():
+	init_db()
+	group_names = plan_crawl(CRAWL_CONFIG)
+	shards = max(1, min(CRAWL_CONFIG['shards'], len(group_names)))
+
+	max_pages = len(group_names) * (PRE_CHECK_WEEKS + MAX_WEEKS)
+	min_hours = max_pages / (shards * CRAWL_CONFIG['requests_per_second']) / 3600
+	logging.info(f"План обхода: {len(group_names)} групп, {shards} шардов, до {max_pages} страниц")
+	if min_hours > CRAWL_CONFIG['nightly_window_hours']:
+		logging.warning(f"При текущих лимитах полный обход может занять до {min_hours:.1f} ч")
+
+	context = multiprocessing.get_context('spawn')
+	results = context.Queue()
+	processes = [
+		context.Process(target=run_shard, args=(shard_id, shard, results, CRAWL_CONFIG))
+		for shard_id, shard in enumerate(shard_groups(group_names, shards))
+	]
+	for process in processes:
+		process.start()
+	try:
+		write_results(results, processes, len(group_names))
+	finally:
+		for process in processes:
+			process.join()
+
+	with sqlite3.connect(DB_PATH) as conn:
+		semester_start = build_academic_calendar(conn, MAX_WEEKS)
+	if semester_start:
+		logging.info(f"Академический календарь обновлен, начало семестра: {semester_start.isoformat()}")
 
 if __name__ == "__main__":
 	logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
 	logging.info(f"Запуск парсера. БД будет сохранена в: {DB_PATH}")
-	try:
-		main()
-	finally:
-		while not DRIVER_POOL._pool.empty():
-			driver = DRIVER_POOL._pool.get()
-			driver.quit()
+	main()
 	logging.info("Парсинг завершен!")
@@ -0,0 +1,238 @@
+import os
+import sys
+import sqlite3
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+
+CHECK_INTERVAL = 2
+
+SCHEDULE_FIELDS = (
+	"week_number", "day_name", "date", "start_time",
+	"end_time", "subject", "classroom", "type"
+)
+SUBJECT_FIELDS = ("day_name", "date", "start_time", "end_time", "classroom", "type")
+
+
+def date_to_int(value):
+	# 'дд.мм' -> ммдд, чтобы сортировка шла по календарю, а не по тексту
+	if not value:
+		return 0
+	day, month = value.split('.')
+	return int(month) * 100 + int(day)
+
+
+def int_to_date(value):
+	return f"{value % 100:02d}.{value // 100:02d}" if value else None
+
+
+def time_to_minutes(value):
+	hours, minutes = value.split(':')
+	return int(hours) * 60 + int(minutes)
+
+
+def minutes_to_time(value):
+	return f"{value // 60:02d}:{value % 60:02d}"
+
+
+class ScheduleSnapshot:
+	def __init__(self, generation, rows):
+		self.generation = generation
+		self.loaded_at = time.time()
+		self.strings = []
+		self._string_ids = {}
+
+		self.group = array('I')
+		self.week = array('H')
+		self.day = array('I')
+		self.date = array('H')
+		self.start = array('H')
+		self.end = array('H')
+		self.subject = array('I')
+		self.classroom = array('I')
+		self.type = array('I')
+
+		self.by_group = {}
+		self.by_subject = {}
+		self.by_week = {}
+		self.by_date = {}
+		self.group_names = []
+
+		self._load(rows)
+
+	def _intern(self, value):
+		string_id = self._string_ids.get(value)
+		if string_id is None:
+			string_id = len(self.strings)
+			self._string_ids[value] = string_id
+			self.strings.append(sys.intern(value))
+		return string_id
+
+	def _load(self, rows):
+		seen_groups = set()
+		decoded = []
+		for group_name, week_number, day_name, date, start_time, end_time, subject, classroom, lesson_type in rows:
+			if group_name not in seen_groups:
+				seen_groups.add(group_name)
+				self.group_names.append(group_name)
+			decoded.append((
+				week_number, date_to_int(date), time_to_minutes(start_time),
+				self._intern(group_name), self._intern(day_name), time_to_minutes(end_time),
+				self._intern(subject), self._intern(classroom), self._intern(lesson_type)
+			))
+
+		# Строки хранятся уже отсортированными, поэтому индексы сразу отдают нужный порядок
+		decoded.sort(key=lambda row: row[:3])
+		for position, (week, date, start, group, day, end, subject, classroom, lesson_type) in enumerate(decoded):
+			self.week.append(week)
+			self.date.append(date)
+			self.start.append(start)
+			self.group.append(group)
+			self.day.append(day)
+			self.end.append(end)
+			self.subject.append(subject)
+			self.classroom.append(classroom)
+			self.type.append(lesson_type)
+
+			self.by_group.setdefault(group, array('I')).append(position)
+			self.by_subject.setdefault(subject, array('I')).append(position)
+			self.by_week.setdefault(week, array('I')).append(position)
+			if date:
+				self.by_date.setdefault(date, array('I')).append(position)
+
+		self._sorted_dates = sorted(self.by_date)
+
+	def _field(self, name, position):
+		strings = self.strings
+		if name == "week_number":
+			return self.week[position]
+		if name == "date":
+			return int_to_date(self.date[position])
+		if name == "start_time":
+			return minutes_to_time(self.start[position])
+		if name == "end_time":
+			return minutes_to_time(self.end[position])
+		if name == "day_name":
+			return strings[self.day[position]]
+		if name == "subject":
+			return strings[self.subject[position]]
+		if name == "classroom":
+			return strings[self.classroom[position]]
+		if name == "type":
+			return strings[self.type[position]]
+		if name == "group_name":
+			return strings[self.group[position]]
+		raise KeyError(name)
+
+	def _rows(self, positions, fields):
+		return [{name: self._field(name, position) for name in fields} for position in positions]
+
+	def groups(self):
+		return list(self.group_names)
+
+	def group_schedule(self, group):
+		group_id = self._string_ids.get(group)
+		if group_id is None:
+			return []
+		return self._rows(self.by_group.get(group_id, ()), SCHEDULE_FIELDS)
+
+	def subject_schedule(self, subject, week):
+		subject_id = self._string_ids.get(subject)
+		if subject_id is None:
+			return []
+		try:
+			week = int(week)
+		except (TypeError, ValueError):
+			return []
+		positions = [p for p in self.by_subject.get(subject_id, ()) if self.week[p] == week]
+		return self._rows(positions, SUBJECT_FIELDS)
+
+	def week_for_date(self, date):
+		# Неделя занятия в указанный день, иначе ближайшего следующего
+		index = bisect_left(self._sorted_dates, date_to_int(date))
+		if index == len(self._sorted_dates):
+			return None
+		return self.week[self.by_date[self._sorted_dates[index]][0]]
+
+	def footprint(self):
+		columns = (
+			self.group, self.week, self.day, self.date, self.start,
+			self.end, self.subject, self.classroom, self.type
+		)
+		column_bytes = sum(column.itemsize * len(column) for column in columns)
+		string_bytes = sum(sys.getsizeof(value) for value in self.strings)
+		index_bytes = 0
+		for index in (self.by_group, self.by_subject, self.by_week, self.by_date):
+			index_bytes += sys.getsizeof(index)
+			index_bytes += sum(positions.itemsize * len(positions) for positions in index.values())
+		return {
+			"rows": len(self.week),
+			"strings": len(self.strings),
+			"column_bytes": column_bytes,
+			"string_bytes": string_bytes,
+			"index_bytes": index_bytes,
+			"total_bytes": column_bytes + string_bytes + index_bytes,
+			"generation": list(self.generation),
+			"loaded_at": self.loaded_at,
+		}
+
+
+class ScheduleStore:
+	def __init__(self, db_path, check_interval=CHECK_INTERVAL):
+		self.db_path = str(db_path)
+		self.check_interval = check_interval
+		self._snapshot = None
+		self._watch_conn = None
+		self._watch_inode = None
+		self._watch_pid = None
+		self._checked_at = 0
+		self._reload_lock = threading.Lock()
+
+	def _generation(self):
+		# data_version меняется при коммите из другого соединения (парсера),
+		# inode - если файл базы подменили целиком; после fork соединение открываем заново
+		stat = os.stat(self.db_path)
+		if self._watch_conn is None or stat.st_ino != self._watch_inode or self._watch_pid != os.getpid():
+			if self._watch_conn is not None and self._watch_pid == os.getpid():
+				self._watch_conn.close()
+			self._watch_conn = sqlite3.connect(self.db_path, check_same_thread=False)
+			self._watch_inode = stat.st_ino
+			self._watch_pid = os.getpid()
+		data_version = self._watch_conn.execute("PRAGMA data_version").fetchone()[0]
+		return (stat.st_ino, stat.st_mtime_ns, data_version)
+
+	def _load(self, generation):
+		with sqlite3.connect(self.db_path) as conn:
+			rows = conn.execute("""
+				SELECT group_name, week_number, day_name, date,
+					start_time, end_time, subject, classroom, type
+				FROM schedule
+				ORDER BY id
+			""").fetchall()
+		snapshot = ScheduleSnapshot(generation, rows)
+		logging.info(f"Расписание загружено в память: {snapshot.footprint()['total_bytes']} байт")
+		return snapshot
+
+	def get(self):
+		snapshot = self._snapshot
+		if snapshot is not None and time.time() - self._checked_at < self.check_interval:
+			return snapshot
+
+		# Перезагрузку выполняет один поток, остальные пока читают старый снимок
+		if not self._reload_lock.acquire(blocking=snapshot is None):
+			return snapshot
+		try:
+			snapshot = self._snapshot
+			generation = self._generation()
+			if snapshot is None or snapshot.generation != generation:
+				self._snapshot = snapshot = self._load(generation)
+			self._checked_at = time.time()
+			return snapshot
+		finally:
+			self._reload_lock.release()
+
+	def footprint(self):
+		return self.get().footprint()